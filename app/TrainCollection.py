@@ -15,7 +15,7 @@ class TrainCollection:
         self.log = logging.getLogger(__class__.__name__)
         self.name = name
         self.filename: str = f"{self.DATA_FOLDER}/{name}.csv"
-        self.already_saved_trains = [] # train ids
+        self.already_saved_trains = [] # train ids as strings, as loaded from the csv file
         self.save_train_dict: Dict[int, Train] = {}
         self.load()
         
@@ -102,7 +102,7 @@ class TrainCollection:
         
         for train_id in saved_trains:
             self.save_train_dict.pop(train_id)
-        self.already_saved_trains.extend(saved_trains)       
+        self.already_saved_trains.extend(str(train_id) for train_id in saved_trains)       
      
     def _train_to_csv_line(self, train: Train) -> str:
         line = f"{train.id};{train.name};{train.from_};{train.to}"
@@ -1,7 +1,6 @@
-import time
 import logging
 import re
-from sts_api.STSApi import STSApi
+from sts_api.STSConnectionManager import STSConnectionError, STSConnectionManager
 from TrainCollection import TrainCollection
 
 # Configure logging
@@ -20,33 +19,52 @@ def sanitize_filename(name: str) -> str:
 
 
 def run():
-    api = STSApi()
-    connected = False
-    while not connected:
-        try:
-            api.connect()
-            connected = True
-        except (ConnectionRefusedError, TimeoutError):
-            time.sleep(2)
-    api.register("STS train collector", "Rene Klemm", "0.0.1", "desc")
-    
-    signal_box_name = api.get_signal_box_info().name
-    sanitized_name = sanitize_filename(signal_box_name)
-    train_collection = TrainCollection(sanitized_name)
+    connection = STSConnectionManager("STS train collector", "Rene Klemm", "0.0.1", "desc")
+    api = connection.api
+    train_collection = None
     
     try:
+        connection.connect()
         while True:
-            logger.info("Running train collection")
-            train_list = api.get_train_list()
-            for train in train_list:
-                train_timetable = api.get_train_timetable(train.id)
-                train_collection.add_train(train_timetable)
+            try:
+                # the simulator may have been restarted with another signal box
+                sanitized_name = sanitize_filename(connection.request(api.get_signal_box_info).name)
+                session = connection.session
+                if train_collection is None or sanitized_name != train_collection.name:
+                    if train_collection is not None:
+                        logger.info(f"Signal box changed to {sanitized_name}")
+                        train_collection.save()
+                    train_collection = TrainCollection(sanitized_name)
+                
+                logger.info("Running train collection")
+                train_list = connection.request(api.get_train_list)
+                if connection.session != session:
+                    logger.warning("Reconnected during train collection, checking signal box again")
+                    continue
+                for train in train_list:
+                    try:
+                        train_timetable = connection.request(api.get_train_timetable, train.id)
+                    except (KeyError, TypeError, ValueError) as err:
+                        logger.error(f"Could not parse timetable of train {train.id}: {err}")
+                        continue
+                    train_collection.add_train(train_timetable)
+                logger.info("Finished train collection")
+            except STSConnectionError as err:
+                # save the trains collected so far and start a new collection right after reconnecting
+                logger.error(f"Train collection interrupted: {err}")
+                if train_collection is not None:
+                    train_collection.save()
+                connection.connect()
+                continue
             train_collection.save()
-            logger.info("Finished train collection")
-            time.sleep(SLEEP_INTERVAL)
+            connection.sleep(SLEEP_INTERVAL)
     
     except KeyboardInterrupt:
         pass
+    finally:
+        if train_collection is not None:
+            train_collection.save()
+        connection.close()
 
 if __name__ == "__main__":
     logger.info("Starting STS Train Collector")
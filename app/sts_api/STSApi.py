@@ -1,5 +1,6 @@
 import logging
 import socket
+import time as system_time
 from datetime import time
 from typing import List, Tuple, Union
 import xmltodict
@@ -9,13 +10,33 @@ from sts_api.models import Flag, FlagName, Node, NodeType, SignalBoxInfo, Status
 class STSApi:
     HOST = "localhost"
     PORT = 3691
+    SOCKET_TIMEOUT = 0.1 # a message is complete when no more data arrives within this time
+    RESPONSE_TIMEOUT = 5 # seconds to wait for the first byte of a response
+    KEEPALIVE_IDLE = 10 # seconds until the first keepalive probe
+    KEEPALIVE_INTERVAL = 5 # seconds between keepalive probes
+    KEEPALIVE_COUNT = 3 # failed probes until the connection is dropped
 
     def __init__(self) -> None:
         self.log = logging.getLogger(__class__.__name__)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.settimeout(0.1)
+        self.socket: Union[socket.socket, None] = None
+        
+    def _create_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.SOCKET_TIMEOUT)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # fine grained keepalive options are not available on every platform
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.KEEPALIVE_IDLE)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.KEEPALIVE_INTERVAL)
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, self.KEEPALIVE_COUNT)
+        return sock
         
     def connect(self) -> Status:
+        # a socket cannot be reused after a failed or closed connection
+        self.close()
+        self.socket = self._create_socket()
         try:
             self.socket.connect((self.HOST, self.PORT))
         except (ConnectionRefusedError, TimeoutError):
@@ -28,6 +49,14 @@ class STSApi:
             resp_dict = self._parse_xml(resp)
             return Status(int(resp_dict["status"]["@code"]), resp_dict["status"]["#text"])
             
+    def close(self) -> None:
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+            
     def register(self, name: str, author: str, version: str, desc: str, protocol_version: int = 1) -> Status:
         req = f"<register name='{name}' autor='{author}' version='{version}' protokoll='{protocol_version}' text='{desc}' />"
         resp = self._send_and_recv(req)
@@ -35,7 +64,7 @@ class STSApi:
         return Status(int(resp_dict["status"]["@code"]), resp_dict["status"]["#text"])
         
     def get_simtime(self) -> int:
-        current_unix_time = time.time()
+        current_unix_time = int(system_time.time() * 1000)
         req = f"<simzeit sender='{current_unix_time}' />"
         resp = self._send_and_recv(req)
         resp_dict = self._parse_xml(resp)
@@ -67,7 +96,13 @@ class STSApi:
         train_list = []
         resp = self._send_and_recv(req)
         resp_dict = self._parse_xml(resp)
-        for train in resp_dict["zugliste"]["zug"]:
+        if resp_dict["zugliste"] is None:
+            # no trains in the signal box
+            return train_list
+        trains = resp_dict["zugliste"]["zug"]
+        if not isinstance(trains, list):
+            trains = [trains]
+        for train in trains:
             train_list.append(Train(int(train["@zid"]), train["@name"]))
         return train_list
     
@@ -312,6 +347,8 @@ class STSApi:
         return self._recv()
     
     def _send(self, msg: str) -> None:
+        if self.socket is None:
+            raise ConnectionError("Not connected to STS plugin interface")
         try:
             self.socket.send(bytes(msg + "\n", "UTF-8"))
         except Exception:
@@ -323,7 +360,11 @@ class STSApi:
         received_at_least_one = False
         while True:
             try:
+                # the simulator may need a while to answer, but once it does the message arrives in one go
+                self.socket.settimeout(self.SOCKET_TIMEOUT if received_at_least_one else self.RESPONSE_TIMEOUT)
                 recv_data = self.socket.recv(4096)
+                if not recv_data:
+                    raise ConnectionResetError("Connection closed by STS plugin interface")
                 msg += str(recv_data, "UTF-8")
                 received_at_least_one = True
             except Exception:
@@ -0,0 +1,123 @@
+import logging
+import random
+import time
+from typing import Any, Callable
+from xml.parsers.expat import ExpatError
+
+from sts_api.STSApi import STSApi
+from sts_api.models import Status
+
+
+# raised when a request could not be completed, even after reconnecting
+class STSConnectionError(ConnectionError):
+    pass
+
+
+class STSConnectionManager:
+    BACKOFF_INITIAL = 1 # seconds
+    BACKOFF_MAX = 60 # seconds
+    HEARTBEAT_INTERVAL = 30 # seconds without traffic until a simtime request is sent
+    MAX_REPLAYS = 1 # how often a failed request is repeated after a reconnect
+    REGISTER_SUCCESS_CODE = 220
+    STABLE_CONNECTION = 60 # seconds a connection has to last until the backoff is reset
+
+    def __init__(self, name: str, author: str, version: str, desc: str, protocol_version: int = 1) -> None:
+        self.log = logging.getLogger(__class__.__name__)
+        self.api = STSApi()
+        self.registration = (name, author, version, desc, protocol_version)
+        self.connected = False
+        self.last_contact = 0.0
+        self.session = 0 # counts successful connects, so callers can detect a reconnect
+        self.connected_at = 0.0
+        self.delay = self.BACKOFF_INITIAL
+
+    def connect(self) -> Status:
+        # connect and register, retry with jittered exponential backoff until it succeeds
+        if self.session > 0 and time.monotonic() - self.connected_at < self.STABLE_CONNECTION:
+            # the last connection dropped shortly after it was established, keep backing off
+            self._backoff("Connection to STS was unstable")
+        else:
+            self.delay = self.BACKOFF_INITIAL
+        while True:
+            try:
+                self.api.connect()
+                status = self.api.register(*self.registration)
+                if status.code != self.REGISTER_SUCCESS_CODE:
+                    raise ConnectionRefusedError(f"Registration rejected: {status}")
+            except (OSError, ExpatError, ValueError, KeyError) as err:
+                # parse errors mean an incomplete or unexpected handshake message
+                self.api.close()
+                self._backoff(f"Connecting to STS failed ({err})")
+            else:
+                self.connected = True
+                self.session += 1
+                self.connected_at = time.monotonic()
+                self.last_contact = self.connected_at
+                self.log.info(f"Registered at STS plugin interface: {status}")
+                return status
+
+    def _backoff(self, reason: str) -> None:
+        # full jitter, so several plugins do not hammer a restarting simulator at once
+        sleep_time = random.uniform(0, self.delay)
+        self.log.warning(f"{reason}, retrying in {sleep_time:.1f}s")
+        time.sleep(sleep_time)
+        self.delay = min(self.delay * 2, self.BACKOFF_MAX)
+
+    def close(self) -> None:
+        self.connected = False
+        self.api.close()
+
+    def request(self, func: Callable[..., Any], *args: Any) -> Any:
+        # run an STSApi method, reconnect and replay it if the connection drops
+        # raises STSConnectionError if it still fails after MAX_REPLAYS reconnects
+        # requests with arguments (e.g. a train id) are not replayed, as the ids may
+        # not be valid anymore after the simulator was restarted
+        attempt = 0
+        while True:
+            if not self.connected:
+                self.connect()
+            try:
+                result = func(*args)
+            except (OSError, ExpatError) as err:
+                # an incomplete response leaves the stream out of sync, so it is handled like a dropped connection
+                self.log.error(f"Request {func.__name__} failed: {err}")
+                self.connected = False
+                self.api.close()
+                if args:
+                    raise STSConnectionError(f"Request {func.__name__}{args} failed") from err
+                if attempt >= self.MAX_REPLAYS:
+                    raise STSConnectionError(f"Request {func.__name__} failed after {attempt} replays") from err
+                attempt += 1
+            else:
+                self.last_contact = time.monotonic()
+                return result
+
+    def heartbeat(self) -> bool:
+        # check the connection with a simtime request if it was idle for HEARTBEAT_INTERVAL
+        # returns False if the connection is lost, it is restored by the next request
+        if not self.connected:
+            return False
+        if time.monotonic() - self.last_contact < self.HEARTBEAT_INTERVAL:
+            return True
+        try:
+            self.api.get_simtime()
+        except (OSError, ExpatError, KeyError, TypeError, ValueError) as err:
+            # an unexpected reply leaves the stream out of sync as well
+            self.log.error(f"Heartbeat failed: {err}")
+            self.connected = False
+            self.api.close()
+            return False
+        self.last_contact = time.monotonic()
+        return True
+
+    def sleep(self, seconds: float) -> None:
+        # sleep while checking the connection with heartbeats
+        # returns early if the connection is lost, so the caller can reconnect and collect again
+        end = time.monotonic() + seconds
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, self.HEARTBEAT_INTERVAL))
+            if not self.heartbeat():
+                return
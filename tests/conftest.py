@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app modules import each other relative to the app folder
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
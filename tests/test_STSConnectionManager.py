@@ -0,0 +1,219 @@
+import importlib.util
+import os
+import re
+import socket
+import threading
+import time
+from typing import List
+
+import pytest
+
+from sts_api.STSApi import STSApi
+from sts_api.STSConnectionManager import STSConnectionError, STSConnectionManager
+
+SIGNAL_BOX_INFO = "<anlageninfo simbuild='1' name='Testbox' aid='1' region='Test' online='false'/>"
+TRACK_LIST = "<bahnsteigliste><bahnsteig name='1' haltepunkt='false'/><bahnsteig name='2' haltepunkt='false'/></bahnsteigliste>"
+TRAIN_DETAILS = ("<zugdetails zid='{id}' name='RE {id}' verspaetung='0' gleis='1' plangleis='1' von='A' nach='B' "
+                 "sichtbar='true' amgleis='false' usertext='' usertextsender=''/>")
+TIMETABLE = "<zugfahrplan zid='{id}'><gleis plan='1' name='1' an='10:00' ab='10:01' flags=''/></zugfahrplan>"
+SIMTIME = "<simzeit sender='0' zeit='1000'/>"
+
+
+def session(register_code: int = 220, answered_requests: int = None, response_delay: float = 0,
+            trains: List[int] = None, simtime_reply: str = SIMTIME) -> dict:
+    # behaviour of the fake server for one connection
+    # answered_requests: number of requests answered before the connection is closed, None for no limit
+    return {
+        "register_code": register_code,
+        "answered_requests": answered_requests,
+        "response_delay": response_delay,
+        "trains": trains if trains is not None else [1, 2],
+        "simtime_reply": simtime_reply,
+    }
+
+
+class FakeSTSServer:
+    # every accepted connection uses the next session config, the last one is repeated
+    def __init__(self, sessions: List[dict]) -> None:
+        self.sessions = sessions
+        self.connections = 0
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("localhost", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            config = self.sessions[min(self.connections, len(self.sessions) - 1)]
+            self.connections += 1
+            with conn:
+                self._handle(conn, dict(config))
+
+    def _handle(self, conn: socket.socket, config: dict) -> None:
+        conn.send(b"<status code='300'>STS plugin interface</status>")
+        while True:
+            try:
+                data = str(conn.recv(4096), "UTF-8")
+            except OSError:
+                return
+            if not data:
+                return
+            if data.startswith("<register"):
+                conn.send(bytes(f"<status code='{config['register_code']}'>register</status>", "UTF-8"))
+                continue
+            if config["answered_requests"] is not None:
+                if config["answered_requests"] == 0:
+                    return
+                config["answered_requests"] -= 1
+            time.sleep(config["response_delay"])
+            conn.send(bytes(self._response(data, config), "UTF-8"))
+
+    def _response(self, request: str, config: dict) -> str:
+        train_id = re.search(r"zid='(\d+)'", request)
+        if request.startswith("<anlageninfo"):
+            return SIGNAL_BOX_INFO
+        if request.startswith("<bahnsteigliste"):
+            return TRACK_LIST
+        if request.startswith("<zugliste"):
+            trains = "".join(f"<zug zid='{id}' name='RE {id}'/>" for id in config["trains"])
+            return f"<zugliste>{trains}</zugliste>"
+        if request.startswith("<zugdetails"):
+            return TRAIN_DETAILS.format(id=train_id.group(1))
+        if request.startswith("<zugfahrplan"):
+            return TIMETABLE.format(id=train_id.group(1))
+        if request.startswith("<simzeit"):
+            return config["simtime_reply"]
+        return "<status code='400'>unknown request</status>"
+
+    def close(self) -> None:
+        self.server.close()
+
+
+@pytest.fixture
+def create_server(monkeypatch):
+    servers = []
+
+    def _create(sessions: List[dict]) -> FakeSTSServer:
+        server = FakeSTSServer(sessions)
+        monkeypatch.setattr(STSApi, "PORT", server.port)
+        monkeypatch.setattr(STSConnectionManager, "BACKOFF_INITIAL", 0.01)
+        servers.append(server)
+        return server
+
+    yield _create
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def create_manager(create_server):
+    managers = []
+
+    def _create(sessions: List[dict]):
+        server = create_server(sessions)
+        manager = STSConnectionManager("test", "test", "0.0.1", "test")
+        managers.append(manager)
+        return server, manager
+
+    yield _create
+    for manager in managers:
+        manager.close()
+
+
+def test_request_is_replayed_after_drop(create_manager):
+    server, manager = create_manager([session(answered_requests=0), session()])
+    manager.connect()
+
+    train_list = manager.request(manager.api.get_train_list)
+
+    assert [train.id for train in train_list] == [1, 2]
+    assert server.connections == 2
+    assert manager.session == 2
+
+
+def test_request_fails_after_max_replays(create_manager):
+    server, manager = create_manager([session(answered_requests=0)])
+    manager.connect()
+
+    with pytest.raises(STSConnectionError):
+        manager.request(manager.api.get_train_list)
+    assert server.connections == manager.MAX_REPLAYS + 1
+    assert not manager.connected
+
+
+def test_request_with_arguments_is_not_replayed(create_manager):
+    server, manager = create_manager([session(answered_requests=0)])
+    manager.connect()
+
+    with pytest.raises(STSConnectionError):
+        manager.request(manager.api.get_train_timetable, 1)
+    assert server.connections == 1
+
+
+def test_slow_response_does_not_reconnect(create_manager):
+    server, manager = create_manager([session(response_delay=0.5)])
+    manager.connect()
+
+    train_list = manager.request(manager.api.get_train_list)
+
+    assert [train.id for train in train_list] == [1, 2]
+    assert manager.session == 1
+
+
+def test_connect_retries_rejected_registration(create_manager):
+    server, manager = create_manager([session(register_code=400), session()])
+
+    status = manager.connect()
+
+    assert status.code == 220
+    assert server.connections == 2
+    assert manager.session == 1
+
+
+def test_heartbeat_with_unexpected_reply(create_manager, monkeypatch):
+    server, manager = create_manager([session(simtime_reply="<status code='400'>unknown</status>")])
+    monkeypatch.setattr(manager, "HEARTBEAT_INTERVAL", 0.01)
+    manager.connect()
+
+    start = time.monotonic()
+    manager.sleep(10)
+
+    assert time.monotonic() - start < 5
+    assert not manager.connected
+
+
+def load_collector():
+    path = os.path.join(os.path.dirname(__file__), "..", "app", "sts-train-collector.py")
+    spec = importlib.util.spec_from_file_location("sts_train_collector", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_run_saves_trains_and_resumes_after_drop(create_server, monkeypatch, tmp_path):
+    # the first connection drops while fetching the timetable of train 2, after the
+    # signal box info (1), train list (1) and timetable of train 1 (4) were answered
+    # train 1 is not in the second session, so it can only be saved from the first one
+    server = create_server([session(answered_requests=6), session(trains=[2])])
+    monkeypatch.chdir(tmp_path)
+    sleep_calls = []
+
+    def stop_after_cycle(self, seconds: float) -> None:
+        sleep_calls.append(seconds)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(STSConnectionManager, "sleep", stop_after_cycle)
+    load_collector().run()
+
+    with open(tmp_path / "data" / "Testbox.csv", "r", encoding="utf-8") as file:
+        train_ids = [line.split(";")[0] for line in file.readlines()[1:]]
+    assert train_ids == ["1", "2"]
+    assert server.connections == 2
+    # the collection resumed right after the drop, the only sleep is after the completed cycle
+    assert len(sleep_calls) == 1